@@ -15,10 +15,10 @@
 
 """Disk checks."""
 
-import dbm
-import json
+import mmap
+import os
 import os.path
-import platform
+import struct
 import sys
 import time
 
@@ -28,12 +28,50 @@ import psutil
 # Local imports
 import libnagios
 
+IS_WINDOWS = sys.platform == "win32"
+
+# Fields reported by psutil.cpu_times() on this platform
+CPU_FIELDS = psutil.cpu_times()._fields
+SORTED_FIELDS = tuple(sorted(CPU_FIELDS))
+
+# State file record: timestamp followed by one double per CPU field
+RECORD = struct.Struct("=Q" + "d" * len(CPU_FIELDS))
+
+# Number of records in the state file ring.  Fixed so checks with a
+# different --time-span can share a state file.  Fits in 4 KiB.
+SLOTS = 4096 // RECORD.size
+
 TEMPLATE = """CPU Usage  {swap_free:,.3f} GB ({swap_free_pct:.2%})
 Swap Total: {swap_total:,.3f} GB
 Swap Used: {swap_used:,.3f} GB ({swap_used_pct:.2f})
 """
 
 
+def epoch() -> int:
+    """Current time in whole seconds since the epoch.
+
+    Integer arithmetic on ``time_ns()`` avoids the float round trip of
+    ``int(time.time())``.  A monotonic clock is no use here as the
+    timestamps are kept across runs and reboots.
+
+    """
+    return time.time_ns() // 10**9
+
+
+def default_state() -> str:
+    """Default path to the state file.
+
+    Only computed when ``--state-file`` is not given since resolving the
+    path costs a few syscalls.
+
+    """
+    if IS_WINDOWS:
+        return os.path.join(
+            os.path.dirname(os.path.realpath(sys.argv[0])), "check_cp_cpu.bin"
+        )
+    return os.path.expanduser("~/.check_cp_cpu.bin")
+
+
 class ReturnErr(Exception):
     """Exception indicating the error message to return"""
 
@@ -43,24 +81,18 @@ class ReturnErr(Exception):
         self.status = status
 
 
-# pylint: disable=consider-using-generator
 class Check(libnagios.plugin.Plugin):
     """Nagios plugin to perform CPU checks."""
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        self.current = psutil.cpu_times()
+    def init(self):
+        """Initialize things that are needed in this module"""
+        # pylint: disable=attribute-defined-outside-init
+        self.current = None
+        # True when the state ring wraps before covering --time-span
+        self.short = False
 
     def cli(self):
         """Add command line arguments specific to the plugin."""
-        # Default config.ini path
-        winpath = os.path.join(
-            os.path.dirname(os.path.realpath(sys.argv[0])), "check_cp_cpu.db"
-        )
-        posixpath = os.path.expanduser("~/.check_cp_cpu.db")
-        cfgpath = winpath if platform.system() == "Windows" else posixpath
-
         self.parser.add_argument(
             "-t",
             "--time-span",
@@ -75,8 +107,9 @@ class Check(libnagios.plugin.Plugin):
             "-s",
             "--state-file",
             dest="state",
-            default=cfgpath,
-            help="Path to state database [Default: %(default)s]",
+            default=None,
+            help="Path to state file [Default: ~/.check_cp_cpu.bin or "
+            "check_cp_cpu.bin next to the plugin on Windows]",
         )
         # pylint: disable=consider-using-f-string
         self.parser.add_argument(
@@ -89,7 +122,7 @@ class Check(libnagios.plugin.Plugin):
             default=[["user", 80.0], ["system", 50.0]],
             help="CPU usage percent to warn at.  The defaults are 80 for "
             "'user' and 50 for 'system'.  Valid states are: %s"
-            % ", ".join(self.current._fields),
+            % ", ".join(CPU_FIELDS),
         )
         self.parser.add_argument(
             "-c",
@@ -101,54 +134,75 @@ class Check(libnagios.plugin.Plugin):
             default=[["user", 80.0], ["system", 50.0]],
             help="CPU usage percent to go critical at.  The defaults are 90 "
             "for 'user' and 75 for 'system'.  Valid states are: %s"
-            % ", ".join(self.current._fields),
+            % ", ".join(CPU_FIELDS),
         )
 
-    def get_history(self):
-        """Get the history and state from the db cache"""
-        try:
-            statedb = dbm.open(self.opts.state, "c")
-        except dbm.error as err:
-            raise ReturnErr(
-                f"Failed to open state db: {err}",
-                libnagios.types.Status.UNKNOWN,
-            ) from None
-
-        now = int(time.time())
-        old = now - self.opts.span * 3
+    def get_history(self, now: int):
+        """Get the history and state from the state file
 
-        statedb[str(now)] = json.dumps(self.current._asdict())
+        The state file is a ring of fixed size records, each one holding a
+        timestamp followed by the CPU times sampled at that time.  Empty
+        slots have a timestamp of zero.  The current sample always replaces
+        the oldest record so stale data never needs cleaning up.
 
-        closest = None
-        for key in list(statedb.keys()):
-            timestamp = int(key.decode("utf-8"))
+        The ring holds :data:`SLOTS` records whatever the span so checks
+        can share a state file.  If checks run so often that the ring no
+        longer reaches back ``span`` seconds :attr:`short` is set.
 
-            # Cleanup of old stuff
-            if timestamp < old:
-                del statedb[key]
-                continue
+        Parameters:
+            now: Timestamp of the current sample from :func:`epoch`.
 
-            # Ignore current timestamp
-            if timestamp == now:
-                continue
+        """
+        size = RECORD.size * SLOTS
+        span = self.opts.span
+        old = now - span * 3
 
-            if closest is None:
-                closest = timestamp
-                continue
-
-            cl_distance = abs(self.opts.span - (now - closest))
+        if self.opts.state is None:
+            self.opts.state = default_state()
+        try:
+            fd = os.open(
+                self.opts.state,
+                os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0),
+                0o600,
+            )
+            try:
+                if os.fstat(fd).st_size != size:
+                    # New file or different record layout, start empty
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                with mmap.mmap(fd, size) as ring:
+                    entries = list(RECORD.iter_unpack(ring))
+                    stamps = [entry[0] for entry in entries]
+
+                    # Ignore empty slots, old stuff and the current second
+                    closest = min(
+                        (x for x in entries if x[0] >= old and x[0] != now),
+                        key=lambda x: abs(span - (now - x[0])),
+                        default=None,
+                    )
 
-            if abs(self.opts.span - (now - timestamp)) < cl_distance:
-                closest = timestamp
+                    # Replace a sample taken this same second or the oldest
+                    oldest = min(stamps)
+                    self.short = oldest > now - span
+                    slot = stamps.index(now if now in stamps else oldest)
+                    RECORD.pack_into(
+                        ring, slot * RECORD.size, now, *self.current
+                    )
+            finally:
+                os.close(fd)
+        except OSError as err:
+            raise ReturnErr(
+                f"Failed to open state file: {err}",
+                libnagios.types.Status.UNKNOWN,
+            ) from None
 
         if closest is None:
             raise ReturnErr(
                 "Not enough data points yet..", libnagios.types.Status.UNKNOWN
             ) from None
 
-        history = json.loads(statedb[str(closest)])
-        statedb.close()
-        return closest, history
+        history = dict(zip(CPU_FIELDS, closest[1:]))
+        return closest[0], history
 
     # Yes we know this is a big function.
     # pylint: disable=too-many-locals,too-many-branches
@@ -157,15 +211,14 @@ class Check(libnagios.plugin.Plugin):
         # validate types
         warn = {}
         critical = {}
-        current = self.current._asdict()
         for key, value in self.opts.warn:
-            if key not in current:
+            if key not in CPU_FIELDS:
                 # pylint: disable=consider-using-f-string
                 self.message = (
                     "Invalid CPU state: [%s]. Valid values are [%s]"
                     % (
                         key,
-                        ", ".join(current.keys()),
+                        ", ".join(CPU_FIELDS),
                     )
                 )
                 self.status = libnagios.types.Status.UNKNOWN
@@ -178,13 +231,13 @@ class Check(libnagios.plugin.Plugin):
                 return
 
         for key, value in self.opts.critical:
-            if key not in current:
+            if key not in CPU_FIELDS:
                 self.message = (
                     # pylint: disable=consider-using-f-string
                     "Invalid CPU state: [%s]. Valid values are [%s]"
                     % (
                         key,
-                        ", ".join(current.keys()),
+                        ", ".join(CPU_FIELDS),
                     )
                 )
                 self.status = libnagios.types.Status.UNKNOWN
@@ -196,38 +249,28 @@ class Check(libnagios.plugin.Plugin):
                 self.status = libnagios.types.Status.UNKNOWN
                 return
 
-        now = time.time()
+        self.current = psutil.cpu_times()
+        current = self.current._asdict()
+        now = epoch()
         try:
-            closest, history = self.get_history()
+            closest, history = self.get_history(now)
         except ReturnErr as err:
             self.message = err.message
             self.status = err.status
             return
 
-        start_ticks = sum([history[x] for x in history])
-        end_ticks = sum([current[x] for x in current])
-        total = end_ticks - start_ticks
-
-        used = (
-            sum(
-                [
-                    (current[x] - history[x])
-                    for x in current
-                    if x not in ("idle",)
-                ]
-            )
-            / total
-            * 100
-        )
+        deltas = {x: current[x] - history[x] for x in current}
+        total = sum(deltas.values())
+        used = (total - deltas.get("idle", 0)) / total * 100
 
         self.message = f"ticks: {total}"
 
-        stats = {x: ((current[x] - history[x]) / total) * 100 for x in current}
+        stats = {x: delta / total * 100 for x, delta in deltas.items()}
+        seconds = now - closest
         output = []
 
         for key, value in critical.items():
             if stats[key] > value:
-                seconds = abs(closest - now)
                 output.append(
                     f"CRITICAL: {key} CPU is {stats[key]}% for the last "
                     f"{seconds} seconds"
@@ -246,7 +289,13 @@ class Check(libnagios.plugin.Plugin):
         if not output:
             output = [f"CPU Usage OK at {used:.2f}%"]
 
-        for key in sorted(stats.keys()):
+        if self.short:
+            output.append(
+                f"State file only covers {seconds} seconds, checks run too "
+                f"often to cover the {self.opts.span} second span"
+            )
+
+        for key in SORTED_FIELDS:
             output.append(f"{key} CPU usage: {stats[key]:.2f}%")
 
         self.message = "\n".join(output)
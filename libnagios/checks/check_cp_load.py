@@ -16,7 +16,7 @@
 """Disk checks."""
 
 import logging
-import platform
+import sys
 import time
 
 # 3rd party
@@ -25,7 +25,24 @@ import psutil
 # Local imports
 import libnagios
 
-logging.getLogger(__name__).addHandler(logging.NullHandler())
+_LOG = logging.getLogger(__name__)
+if not _LOG.handlers:
+    _LOG.addHandler(logging.NullHandler())
+
+IS_WINDOWS = sys.platform == "win32"
+
+# Windows has no load average.  psutil emulates it with a sampler that is
+# started by the first getloadavg() call and only returns meaningful numbers
+# after about 5 seconds.  Start it at import so the wait overlaps with
+# argument parsing and only the remainder is spent in execute().
+WARMUP = 5.5
+if IS_WINDOWS:
+    try:
+        psutil.getloadavg()
+    except OSError:
+        # Reported properly when execute() gathers the load average
+        pass
+_PRIMED = time.monotonic()
 
 TEMPLATE = """Load {status} :: {msg}
 One minute:      {one:.1f}
@@ -187,12 +204,9 @@ class Check(libnagios.plugin.Plugin):
         """Execute the actual working parts of the plugin."""
         log = logging.getLogger(f"{__name__}.{__class__.__name__}.execute")
         try:
+            if IS_WINDOWS:
+                time.sleep(max(0.0, _PRIMED + WARMUP - time.monotonic()))
             stats = dict(zip(["one", "five", "fifteen"], psutil.getloadavg()))
-            if platform.system() == "Windows":
-                time.sleep(5.5)
-                stats = dict(
-                    zip(["one", "five", "fifteen"], psutil.getloadavg())
-                )
         except OSError as err:
             self.message = f"Error gathering load average: {err}"
             self.status = libnagios.types.Status.UNKNOWN
@@ -205,7 +219,7 @@ class Check(libnagios.plugin.Plugin):
             (libnagios.types.Status.WARN, self.opts.warn),
             (libnagios.types.Status.CRITICAL, self.opts.critical),
         ):
-            log.debug("one:%0.1f five:%0.1f fifteen:%0.1f", *list(values))
+            log.debug("one:%0.1f five:%0.1f fifteen:%0.1f", *values)
             output[status] = []
             one, five, fifteen = values
             if stats["one"] > one:
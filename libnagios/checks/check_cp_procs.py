@@ -15,7 +15,8 @@
 
 """Disk checks."""
 
-import platform
+import os
+import sys
 
 # 3rd party
 import psutil
@@ -23,8 +24,95 @@ import psutil
 # Local imports
 import libnagios
 
+IS_WINDOWS = sys.platform == "win32"
+
+if IS_WINDOWS:
+    pwd = None  # pylint: disable=invalid-name
+else:
+    import pwd
+
 TEMPLATE = """Processes {check} {status} :: {prefix}{msg}{postfix}{range}"""
 
+# Linux truncates /proc/<pid>/comm to this many bytes
+COMM_LEN = 15
+
+# Placeholder psutil stores for attributes we were not allowed to read
+DENIED = object()
+
+
+def _field(info: dict, name: str):
+    """Get an attribute from ``info`` failing if access was denied."""
+    value = info[name]
+    if value is DENIED:
+        raise libnagios.exceptions.UnknownError(
+            f"Insufficient permissions to check process {name}"
+        )
+    return value
+
+
+def _settle(proc: psutil.Process) -> bool:
+    """Re-read attributes ``process_iter`` could not get for ``proc``.
+
+    psutil stores ``ad_value`` for zombies as well as for denied access.
+    Zombies are skipped like any process that went away, attributes that
+    really are denied stay :data:`DENIED` for :func:`_field` to report.
+
+    Returns:
+        False if the process is gone or a zombie, True otherwise.
+
+    """
+    info = proc.info
+    for name, value in info.items():
+        if value is DENIED:
+            try:
+                info[name] = getattr(proc, name)()
+            except psutil.NoSuchProcess:
+                # Also covers psutil.ZombieProcess
+                return False
+            except psutil.AccessDenied:
+                pass
+    return True
+
+
+def _count_by_comm(command: str) -> int:
+    """Count processes named ``command`` using ``/proc/<pid>/comm``.
+
+    Linux only.  Reading a single small file per process is a lot cheaper
+    than going through psutil when the name is all we need.  Names that
+    may have been truncated by the kernel are confirmed through psutil.
+
+    """
+    wanted = os.fsencode(command)
+    count = 0
+    for pid in psutil.pids():
+        try:
+            with open(f"/proc/{pid}/comm", "rb") as handle:
+                comm = handle.read().rstrip(b"\n")
+        except (FileNotFoundError, ProcessLookupError):
+            # Process we are checking for went away. Skip it
+            continue
+        except PermissionError as err:
+            raise libnagios.exceptions.UnknownError(
+                f"Insufficient permissions to check process name: {err}"
+            ) from None
+
+        if len(comm) < COMM_LEN:
+            count += comm == wanted
+            continue
+
+        if not wanted.startswith(comm):
+            continue
+
+        try:
+            count += psutil.Process(pid).name() == command
+        except psutil.NoSuchProcess:
+            continue
+        except psutil.AccessDenied as err:
+            raise libnagios.exceptions.UnknownError(
+                f"Insufficient permissions to check process name: {err}"
+            ) from None
+    return count
+
 
 class Check(libnagios.plugin.Plugin):
     """Nagios plugin to perform process checks."""
@@ -36,6 +124,7 @@ class Check(libnagios.plugin.Plugin):
         # pylint: disable=attribute-defined-outside-init
         self._user_set = False
         self._user = None
+        self._uid = None
 
     def cli(self):
         """Add command line arguments specific to the plugin."""
@@ -109,52 +198,59 @@ class Check(libnagios.plugin.Plugin):
             help="Only scan for processes with VSZ higher than indicated.",
         )
 
-    def skip_proc(self, proc: psutil.Process) -> bool:
+    def proc_attrs(self, *required: str) -> list[str]:
+        """Process attributes needed to apply the configured filters
+
+        Parameters:
+            required: Attributes needed regardless of the filters.
+
+        """
+        attrs = set(required)
+        if self.opts.command:
+            attrs.add("name")
+        if self.user:
+            # Compare uids rather than names to avoid per process NSS lookups
+            attrs.add("username" if IS_WINDOWS else "uids")
+        if self.opts.rss is not None or self.opts.vsz is not None:
+            attrs.add("memory_info")
+        return list(attrs)
+
+    # pylint: disable=too-many-return-statements
+    def skip_proc(self, info: dict) -> bool:
         """Apply base filters to processes
 
+        Parameters:
+            info: Process attributes as gathered by ``psutil.process_iter``
+                using :meth:`Check.proc_attrs`.
+
         Returns:
             True if the process should be skiped due to common rules being
             triggered.  False if the process should not be filtered out.
 
         """
-        skip = False
-        try:
-            if (
-                not skip
-                and self.opts.command
-                and proc.name() != self.opts.command
-            ):
-                skip = True
-
-            if not skip and self.user and proc.username() != self.user:
-                skip = True
-
-            if not skip:
-                meminfo = proc.memory_info()
-
-                if (
-                    not skip
-                    and self.opts.rss is not None
-                    and meminfo.rss < self.opts.rss
-                ):
-                    # Skip processes that don't meet the minimum RSS size
-                    skip = True
-
-                if (
-                    not skip
-                    and self.opts.vsz is not None
-                    and meminfo.vms < self.opts.vsz
-                ):
-                    # Skip processes that don't meet the minimum VSZ size
-                    skip = True
-        except psutil.NoSuchProcess:
-            # Process we are checking for went away. Skip it
-            skip = True
-        except psutil.AccessDenied as err:
-            raise libnagios.exceptions.UnknownError(
-                f"Insufficient permissions to check processes ownership: {err}"
-            ) from None
-        return skip
+        cmd = self.opts.command
+        if cmd and _field(info, "name") != cmd:
+            return True
+
+        if self.user:
+            if IS_WINDOWS:
+                if _field(info, "username") != self.user:
+                    return True
+            elif _field(info, "uids").real != self._uid:
+                return True
+
+        if self.opts.rss is None and self.opts.vsz is None:
+            return False
+
+        meminfo = _field(info, "memory_info")
+        if self.opts.rss is not None and meminfo.rss < self.opts.rss:
+            # Skip processes that don't meet the minimum RSS size
+            return True
+
+        if self.opts.vsz is not None and meminfo.vms < self.opts.vsz:
+            # Skip processes that don't meet the minimum VSZ size
+            return True
+        return False
 
     def process_procs(self, state: dict[str, str]):
         """Process PROCS metrics flavor
@@ -163,15 +259,21 @@ class Check(libnagios.plugin.Plugin):
             state: state dictionary from the execute function
 
         """
-        # Filter processes based on criteria
-        count = 0
-        for proc in psutil.process_iter():
-            with proc.oneshot():
-                if self.skip_proc(proc):
-                    continue
-
-                # increment various counters
-                count += 1
+        attrs = self.proc_attrs()
+        if not attrs:
+            # No filters, no need to look inside each process
+            count = len(psutil.pids())
+        elif attrs == ["name"] and sys.platform.startswith("linux"):
+            # Only filtering on the command name
+            count = _count_by_comm(self.opts.command)
+        else:
+            # Filter processes based on criteria
+            skip = self.skip_proc
+            count = sum(
+                1
+                for proc in psutil.process_iter(attrs=attrs, ad_value=DENIED)
+                if _settle(proc) and not skip(proc.info)
+            )
         state["msg"] = f"{count} processes"
         if count not in self.opts.warn:
             self.status = libnagios.types.Status.WARN
@@ -198,42 +300,43 @@ class Check(libnagios.plugin.Plugin):
         """
         # Filter processes based on criteria
         errors = []
-        for proc in psutil.process_iter():
-            with proc.oneshot():
-                if self.skip_proc(proc):
-                    continue
-
-                # increment various counters
-                meminfo = proc.memory_info()
-                match flavor:
-                    case "vsz":
-                        value = getattr(meminfo, "vms")
-                    case "rss":
-                        value = getattr(meminfo, "rss")
-                    case _:
-                        raise ValueError(
-                            f"flavor must be either vsz or rss not {flavor}"
-                        )
-                comps = [
-                    (libnagios.types.Status.CRITICAL, self.opts.critical),
-                    (libnagios.types.Status.WARN, self.opts.warn),
-                ]
-
-                for status, comp_range in comps:
-                    if value not in comp_range:
-                        self.status = (
-                            status if self.status < status else self.status
-                        )
-                        word = "inside" if comp_range.inverse else "outside"
-                        value_str = libnagios.utils.units(value)
-                        low_str = libnagios.utils.units(comp_range.low)
-                        high_str = libnagios.utils.units(comp_range.high)
-                        errors.append(
-                            f" {status.name} pid[{proc.pid}] {proc.name()} "
-                            f"[{value_str}] {word} range {low_str} to "
-                            f"{high_str}"
-                        )
-                        break
+        attrs = self.proc_attrs("name", "memory_info")
+        for proc in psutil.process_iter(attrs=attrs, ad_value=DENIED):
+            if not _settle(proc) or self.skip_proc(proc.info):
+                continue
+
+            # increment various counters
+            meminfo = _field(proc.info, "memory_info")
+            match flavor:
+                case "vsz":
+                    value = getattr(meminfo, "vms")
+                case "rss":
+                    value = getattr(meminfo, "rss")
+                case _:
+                    raise ValueError(
+                        f"flavor must be either vsz or rss not {flavor}"
+                    )
+            comps = [
+                (libnagios.types.Status.CRITICAL, self.opts.critical),
+                (libnagios.types.Status.WARN, self.opts.warn),
+            ]
+
+            for status, comp_range in comps:
+                if value not in comp_range:
+                    self.status = (
+                        status if self.status < status else self.status
+                    )
+                    word = "inside" if comp_range.inverse else "outside"
+                    value_str = libnagios.utils.units(value)
+                    low_str = libnagios.utils.units(comp_range.low)
+                    high_str = libnagios.utils.units(comp_range.high)
+                    errors.append(
+                        f" {status.name} pid[{proc.pid}] "
+                        f"{_field(proc.info, 'name')} "
+                        f"[{value_str}] {word} range {low_str} to "
+                        f"{high_str}"
+                    )
+                    break
         state["range"] = "\n".join(errors)
         state["msg"] = f"{len(errors)} processes"
 
@@ -243,20 +346,18 @@ class Check(libnagios.plugin.Plugin):
         # pylint: disable=attribute-defined-outside-init
         if not self._user_set:
             if self.opts.user:
-                if platform.system() == "Windows":
+                if IS_WINDOWS:
                     # Don't do validation on windows.... use as is
                     self._user = self.opts.user
                 else:
-                    import pwd  # pylint: disable=import-outside-toplevel
-
                     try:
                         # Test for user being a uid
                         uid = int(self.opts.user)
-                        self._user = pwd.getpwuid(uid).pw_name
+                        pwent = pwd.getpwuid(uid)
                     except ValueError:
                         # not a uid.  Must be a user name instead
                         try:
-                            self._user = pwd.getpwnam(self.opts.user).pw_name
+                            pwent = pwd.getpwnam(self.opts.user)
                         except KeyError:
                             raise libnagios.exceptions.UnknownError(
                                 f"Invalid user [{self.opts.user}]"
@@ -265,6 +366,8 @@ class Check(libnagios.plugin.Plugin):
                         raise libnagios.exceptions.UnknownError(
                             f"Invalid uid [{self.opts.user}]"
                         ) from None
+                    self._user = pwent.pw_name
+                    self._uid = pwent.pw_uid
             else:
                 self._user = None
             self._user_set = True
@@ -17,7 +17,9 @@ import logging
 # Local imports
 from . import types
 
-logging.getLogger(__name__).addHandler(logging.NullHandler())
+_LOG = logging.getLogger(__name__)
+if not _LOG.handlers:
+    _LOG.addHandler(logging.NullHandler())
 
 
 class NagiosException(Exception):
@@ -13,27 +13,102 @@
 """Plugin template."""
 
 import argparse
-import base64
-import io
-import json
+import codecs
 import logging
 import os
 import sys
 import time
 import typing
 
-# 3rd party imports
-import rich.markdown
-import rich_argparse
-
 # Local imports
 from . import exceptions
 from . import types
 
-logging.getLogger(__name__).addHandler(logging.NullHandler())
+_LOG = logging.getLogger(__name__)
+if not _LOG.handlers:
+    _LOG.addHandler(logging.NullHandler())
+
+# Loggers are looked up once, getLogger() takes the logging module lock
+_LOG_PLUGIN = logging.getLogger(f"{__name__}.Plugin")
+_LOG_ADD_PERF = logging.getLogger(f"{__name__}.Plugin.add_perf")
+_LOG_ADD_PERF_MULTI = logging.getLogger(f"{__name__}.Plugin.add_perf_multi")
+_LOG_FINISH = logging.getLogger(f"{__name__}.Plugin.finish")
+
+# Types allowed as perfdata values
+_PERF_TYPES = (str, float, int)
+
+# argparse actions understood by Plugin._parse_args_fast
+# pylint: disable=protected-access
+_FLAG_ACTIONS = (
+    argparse._StoreTrueAction,
+    argparse._StoreFalseAction,
+    argparse._StoreConstAction,
+)
+_VALUE_ACTIONS = (argparse._StoreAction, argparse._AppendAction)
+# pylint: enable=protected-access
+
+
+def _json_dumps(data: dict) -> bytes:
+    """Encode ``data`` as JSON, using orjson when it is installed.
+
+    Both encoders are imported here, they are only needed with ``--json``.
+
+    """
+    # pylint: disable=import-outside-toplevel,no-member
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            # orjson refuses surrogate escaped text (e.g. undecodable
+            # process names), json escapes it instead
+            pass
+    import json
+
+    return json.dumps(data).encode("utf-8")
+
+
+class _Markdown:  # pylint: disable=too-few-public-methods
+    """Markdown help text that is only parsed when help is displayed."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __rich__(self):
+        # pylint: disable-next=import-outside-toplevel
+        import rich.markdown
+
+        return rich.markdown.Markdown(self.text, style="argparse.text")
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    """Argument parser that only loads rich to display help or usage.
+
+    Importing rich is by far the largest part of a plugin's start up time
+    and most runs never print any help.
 
+    """
+
+    def _use_rich(self):
+        # pylint: disable-next=import-outside-toplevel
+        import rich_argparse
+
+        self.formatter_class = rich_argparse.RichHelpFormatter
+
+    def format_usage(self):
+        self._use_rich()
+        return super().format_usage()
+
+    def format_help(self):
+        self._use_rich()
+        return super().format_help()
 
-class Plugin:
+
+class Plugin:  # pylint: disable=too-many-instance-attributes
     """This class is a template for a nagios plugin.
 
     Attributes:
@@ -49,15 +124,14 @@ class Plugin:
     EPILOG = None
 
     def __init__(self):
-        log = logging.getLogger(f"{__name__}.Plugin")
-        log.debug("Initilization")
+        _LOG_PLUGIN.debug("Initilization")
 
         # Public variables
         self.parser = None
         self.opts = None
 
         self._message = None
-        self._status = types.Status.OK
+        self.status = types.Status.OK
         self._perfdata = {}
         self.init()
 
@@ -83,7 +157,9 @@ class Plugin:
     def message(self, value):
         if not isinstance(value, str):
             raise ValueError("'message' must be a 'str'")
-        if "|" in value:
+        # The whole value is checked, Nagios also reads perfdata after a
+        # pipe on any of the long output lines
+        if value and "|" in value:
             raise ValueError(
                 "'message' must not contain the pipe '|' character"
             )
@@ -104,6 +180,7 @@ class Plugin:
                 "'status' must be an instance of 'libnagios.types.Status'"
             )
         self._status = value
+        self._status_value = value.value
 
     def add_perf(self, key: str, value: typing.Union[str, float, int]):
         """Add performance data to the Nagios output.
@@ -123,12 +200,13 @@ class Plugin:
             value (str, float, or int): Performance metric value to record.
 
         """
-        log = logging.getLogger(f"{__name__}.Plugin.add_perf")
-        log.debug("%s=%s", repr(key), repr(value))
-        if not isinstance(key, str):
+        if _LOG_ADD_PERF.isEnabledFor(logging.DEBUG):
+            _LOG_ADD_PERF.debug("%r=%r", key, value)
+        # Exact type checks are cheaper than isinstance() in this hot path
+        if type(key) is not str:  # pylint: disable=unidiomatic-typecheck
             raise ValueError("When adding perf data 'key' must be a 'str'")
 
-        if not isinstance(key, (str, float, int)):
+        if type(value) not in _PERF_TYPES:
             raise ValueError(
                 f"For key={repr(key)} 'value' must in ('str', 'float', 'int')"
             )
@@ -143,8 +221,7 @@ class Plugin:
 
         Parameters:
             data: Key value pairs added to the perfdata output of the plugin.
-                each key/value pair is sent through
-                :meth:`libnagios.plugin.Plugin.add_perf` to add the data.
+                The whole dictionary is validated before any of it is added.
 
         Raises:
             ValueError: Raised on multiple conditions:
@@ -160,16 +237,26 @@ class Plugin:
             reserved keys.
         """
 
-        log = logging.getLogger(f"{__name__}.Plugin.add_perf_multi")
-        log.debug("data is %s", type(data))
+        _LOG_ADD_PERF_MULTI.debug("data is %s", type(data))
 
         if not isinstance(data, dict):
             raise ValueError(
                 "When adding multiple values 'data' must be a 'dict'"
             )
 
+        # Same checks as add_perf, inlined to skip a method call per key
+        perf_types = _PERF_TYPES
         for key, value in data.items():
-            self.add_perf(key, value)
+            # pylint: disable-next=unidiomatic-typecheck
+            if type(key) is not str:
+                raise ValueError("When adding perf data 'key' must be a 'str'")
+            if type(value) not in perf_types:
+                raise ValueError(
+                    f"For key={repr(key)} 'value' must in "
+                    "('str', 'float', 'int')"
+                )
+
+        self._perfdata.update(data)
 
     def finish(self, as_json: bool = False, limit: int = 4096):
         """Print plugin output for Nagios and exit.
@@ -181,35 +268,56 @@ class Plugin:
         Parameters:
             as_json: If ``True`` print the perfdata as JSON.  If ``False``
                 (default) print the perf data as ``key=value`` one line per
-                key.
-            limit: The amount of output to print.  By defult Nagios will only
-                take the first 4k of output, anything after that will be
-                discarded.  If you compiled your Nagios to handle more
-                than 4k you may adjust ``limit`` to accommodate that.
+                key.  JSON is encoded with ``orjson`` when it is installed.
+            limit: The amount of output to print in bytes.  By defult
+                Nagios will only take the first 4k of output, anything after
+                that will be discarded.  If you compiled your Nagios to
+                handle more than 4k you may adjust ``limit`` to accommodate
+                that.
 
         """
-        log = logging.getLogger(f"{__name__}.Plugin.finish")
-        log.debug("(as_json=%s, limit=%s)", repr(as_json), repr(limit))
-        output = io.StringIO()
-
-        if self._message:
-            output.write(self._message)
-        else:
-            output.write(f"CRITICAL {__name__}.Plugin.message udefined....")
-            self._status = types.Status.CRITICAL
+        _LOG_FINISH.debug("(as_json=%r, limit=%r)", as_json, limit)
+        if not self._message:
+            self._message = f"CRITICAL {__name__}.Plugin.message udefined...."
+            self.status = types.Status.CRITICAL
+
+        # Encode like writing to sys.stdout would, but never fail on the
+        # surrogate escaped text os and psutil hand out
+        encoding = getattr(sys.stdout, "encoding", None) or "utf-8"
+        errors = getattr(sys.stdout, "errors", None) or "strict"
+        if errors == "strict":
+            errors = "surrogateescape"
+        payload = self._render(as_json, encoding, errors)
+        is_utf8 = codecs.lookup(encoding).name == "utf-8"
+        if len(payload) > limit and is_utf8:
+            # Don't split a UTF-8 character, back off its continuation bytes
+            while limit > 0 and payload[limit] & 0xC0 == 0x80:
+                limit -= 1
+
+        # Already encoded, write to the binary buffer under the text layer
+        payload = memoryview(payload)[:limit]
+        sys.stdout.flush()
+        sys.stdout.buffer.write(payload)
+        sys.stdout.buffer.flush()
+        sys.exit(self._status_value)
+
+    def _render(
+        self,
+        as_json: bool,
+        encoding: str = "utf-8",
+        errors: str = "surrogateescape",
+    ) -> bytearray:
+        """Render the message and perfdata as sent to Nagios."""
+        buf = bytearray(self._message.encode(encoding, errors))
         if self._perfdata:
-            output.write("|")
-
+            buf += b"|"
             if as_json:
-                output.write(json.dumps(self._perfdata))
+                buf += _json_dumps(self._perfdata)
             else:
-                perfdata = []
-                for key, value in self._perfdata.items():
-                    perfdata.append(f"{key}={str(value)}")
-                output.write("\n".join(perfdata))
-        output.seek(0)
-        sys.stdout.write(output.read(limit))
-        sys.exit(self._status.value)
+                perfdata = self._perfdata.items()
+                text = "\n".join(f"{k}={v}" for k, v in perfdata)
+                buf += text.encode(encoding, errors)
+        return buf
 
     def cli(self):
         """Override me.
@@ -233,25 +341,17 @@ class Plugin:
         raise RuntimeError("You must implement Plugin.execute in subclass")
 
     def _parse_args(self):
-        random_session = base64.urlsafe_b64encode(os.urandom(9)).decode(
-            "utf-8"
-        )
-        session_id = os.getenv("SESSION_ID", random_session)
+        session_id = os.getenv("SESSION_ID")
+        if session_id is None:
+            import secrets  # pylint: disable=import-outside-toplevel
 
-        epilog = (
-            rich.markdown.Markdown(self.EPILOG, style="argparse.text")
-            if self.EPILOG
-            else None
-        )
-        description = (
-            rich.markdown.Markdown(self.DESCRIPTION, style="argparse.text")
-            if self.DESCRIPTION
-            else None
-        )
-        self.parser = argparse.ArgumentParser(
-            formatter_class=rich_argparse.RichHelpFormatter,
-            description=description,
-            epilog=epilog,
+            session_id = secrets.token_urlsafe(9)
+
+        self.parser = _ArgumentParser(
+            description=(
+                _Markdown(self.DESCRIPTION) if self.DESCRIPTION else None
+            ),
+            epilog=_Markdown(self.EPILOG) if self.EPILOG else None,
         )
 
         self.parser.add_argument(
@@ -289,10 +389,114 @@ class Plugin:
         )
 
         self.cli()
-        self.opts = self.parser.parse_args()
+        self.opts = self._parse_args_fast(sys.argv[1:])
+        if self.opts is None:
+            self.opts = self.parser.parse_args()
         if self.opts.debug_log:
             self.opts.debug = True
 
+    # pylint: disable=protected-access,too-many-branches,too-many-locals
+    # pylint: disable=too-many-return-statements
+    def _parse_args_fast(
+        self, args: list
+    ) -> typing.Optional[argparse.Namespace]:
+        """Parse the command line without the full argparse machinery.
+
+        Only the plain forms the plugins use are handled: flags, options
+        taking a fixed number of values (``store`` and ``append``) and
+        ``--option=value``.  Values are converted and checked with the
+        parser's own helpers so the results match ``parse_args``.
+
+        Returns:
+            The parsed options, or ``None`` when something else is found
+            (help, positionals, abbreviations, bad values, ...) in which
+            case argparse should parse the command line and report errors.
+
+        """
+        parser = self.parser
+        if any(not x.option_strings or x.required for x in parser._actions):
+            return None
+
+        opts = argparse.Namespace()
+        for action in parser._actions:
+            if action.default is not argparse.SUPPRESS and not hasattr(
+                opts, action.dest
+            ):
+                setattr(opts, action.dest, action.default)
+        # Parser level defaults from set_defaults() no option writes to
+        for dest, value in parser._defaults.items():
+            if not hasattr(opts, dest):
+                setattr(opts, dest, value)
+
+        seen = set()
+        index = 0
+        while index < len(args):
+            arg = args[index]
+            index += 1
+            value = None
+            if arg.startswith("--") and "=" in arg:
+                arg, value = arg.split("=", 1)
+            action = parser._option_string_actions.get(arg)
+            if action is None:
+                return None
+            seen.add(action)
+
+            kind = type(action)
+            if kind in _FLAG_ACTIONS:
+                if value is not None:
+                    return None
+                setattr(opts, action.dest, action.const)
+                continue
+            if kind not in _VALUE_ACTIONS:
+                return None
+
+            count = 1 if action.nargs is None else action.nargs
+            if not isinstance(count, int):
+                return None
+            if value is not None:
+                if count != 1:
+                    return None
+                values = [value]
+            else:
+                values = args[index : index + count]
+                index += count
+                if len(values) != count or any(
+                    x.startswith("-") for x in values
+                ):
+                    return None
+
+            try:
+                values = [parser._get_value(action, x) for x in values]
+                for item in values:
+                    parser._check_value(action, item)
+            except argparse.ArgumentError:
+                return None
+            result = values[0] if action.nargs is None else values
+
+            if kind is argparse._AppendAction:
+                items = list(getattr(opts, action.dest, None) or [])
+                items.append(result)
+                result = items
+            setattr(opts, action.dest, result)
+
+        for group in parser._mutually_exclusive_groups:
+            if len(seen.intersection(group._group_actions)) > 1:
+                return None
+
+        # argparse converts string defaults with the action type
+        for action in parser._actions:
+            if (
+                action not in seen
+                and isinstance(action.default, str)
+                and getattr(opts, action.dest, None) is action.default
+            ):
+                try:
+                    value = parser._get_value(action, action.default)
+                except argparse.ArgumentError:
+                    return None
+                setattr(opts, action.dest, value)
+        return opts
+
     def main(self):
         """Entry point into the class and it's subclasses.
 
@@ -342,6 +546,6 @@ class Plugin:
             self.status = err.status
         runtime = time.time() - start
         self.add_perf("epoch", start)
-        self.add_perf("runtime", f"{runtime:.2f}")
+        self.add_perf("runtime", round(runtime, 2))
         self.add_perf("state", self.status.name)
         self.finish(as_json=self.opts.as_json)
@@ -16,7 +16,9 @@ import logging
 import re
 
 
-logging.getLogger(__name__).addHandler(logging.NullHandler())
+_LOG = logging.getLogger(__name__)
+if not _LOG.handlers:
+    _LOG.addHandler(logging.NullHandler())
 
 
 class Range:
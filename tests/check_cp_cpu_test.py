@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""UNIT TEST for libnagios.checks.check_cp_cpu"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, "..")
+import libnagios
+from libnagios.checks import check_cp_cpu
+
+FIELDS = len(check_cp_cpu.CPU_FIELDS)
+
+
+def sample(value):
+    """CPU times with every field set to ``value``"""
+    return tuple(float(value) for _ in range(FIELDS))
+
+
+class TestEpoch(unittest.TestCase):
+    def test_epoch(self):
+        self.assertIsInstance(check_cp_cpu.epoch(), int)
+        self.assertLessEqual(abs(check_cp_cpu.epoch() - time.time()), 1)
+
+    def test_epoch_truncates(self):
+        with mock.patch.object(
+            check_cp_cpu.time, "time_ns", return_value=12_345_678_999_999_999
+        ):
+            self.assertEqual(check_cp_cpu.epoch(), 12_345_678)
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        handle, self.state = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.unlink, self.state)
+
+    def history(self, now, span=300, value=None):
+        check = check_cp_cpu.Check()
+        check.opts = argparse.Namespace(span=span, state=self.state)
+        check.current = sample(now if value is None else value)
+        result = check.get_history(now)
+        return result, check
+
+    def seed(self, now, **kwargs):
+        """Record a sample ignoring the lack of history on the first run"""
+        try:
+            self.history(now, **kwargs)
+        except check_cp_cpu.ReturnErr:
+            pass
+
+    def stamps(self):
+        with open(self.state, "rb") as handle:
+            data = handle.read()
+        return sorted(x[0] for x in check_cp_cpu.RECORD.iter_unpack(data))
+
+    def test_first_run(self):
+        with self.assertRaises(check_cp_cpu.ReturnErr) as ctx:
+            self.history(1000)
+        self.assertEqual(ctx.exception.status, libnagios.types.Status.UNKNOWN)
+        size = check_cp_cpu.RECORD.size * check_cp_cpu.SLOTS
+        self.assertEqual(os.path.getsize(self.state), size)
+        self.assertLessEqual(size, 4096)
+
+    def test_closest(self):
+        for now in range(1000, 1600, 60):
+            self.seed(now)
+        (closest, history), check = self.history(1600)
+        self.assertEqual(closest, 1300)
+        self.assertEqual(history["idle"], 1300.0)
+        self.assertFalse(check.short)
+
+    def test_same_second(self):
+        self.seed(1000)
+        self.history(1060, value=1)
+        (closest, history), _ = self.history(1060, value=2)
+        self.assertEqual((closest, history["idle"]), (1000, 1000.0))
+        self.assertEqual(self.stamps().count(1060), 1)
+
+    def test_shared_spans(self):
+        now = 1000
+        self.seed(now, span=300)
+        for _ in range(6):
+            now += 60
+            self.history(now, span=900)
+            now += 60
+            self.history(now, span=300)
+        self.assertEqual(self.stamps()[-13:], list(range(1000, now + 1, 60)))
+
+    def test_wrap(self):
+        start = 1000
+        total = check_cp_cpu.SLOTS + 5
+        self.seed(start)
+        for now in range(start + 1, start + total):
+            _, check = self.history(now)
+        stamps = self.stamps()
+        self.assertEqual(len(stamps), check_cp_cpu.SLOTS)
+        self.assertEqual(stamps[0], start + 5)
+        self.assertEqual(stamps[-1], start + total - 1)
+        self.assertTrue(check.short)
+
+    def test_reset_layout(self):
+        with open(self.state, "wb") as handle:
+            handle.write(b"\xff" * 10)
+        with self.assertRaises(check_cp_cpu.ReturnErr):
+            self.history(1000)
+        self.assertEqual(self.stamps()[-1], 1000)
+
+    def test_open_error(self):
+        check = check_cp_cpu.Check()
+        check.opts = argparse.Namespace(
+            span=300, state=os.path.join(self.state, "missing")
+        )
+        check.current = sample(0)
+        with self.assertRaises(check_cp_cpu.ReturnErr) as ctx:
+            check.get_history(1000)
+        self.assertIn("Failed to open state file", ctx.exception.message)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""UNIT TEST for libnagios.checks.check_cp_procs"""
+
+import argparse
+import io
+import sys
+import unittest
+from unittest import mock
+
+import psutil
+
+sys.path.insert(0, "..")
+import libnagios
+from libnagios.checks import check_cp_procs
+
+
+def make_check(**kwargs):
+    opts = {
+        "warn": libnagios.utils.Range("10"),
+        "critical": libnagios.utils.Range("20"),
+        "metric": "PROCS",
+        "command": None,
+        "user": None,
+        "rss": None,
+        "vsz": None,
+    }
+    opts.update(kwargs)
+    check = check_cp_procs.Check()
+    check.opts = argparse.Namespace(**opts)
+    return check
+
+
+class FakeProc:
+    def __init__(self, pid, name, rss=0, uid=0):
+        self.pid = pid
+        self.info = {
+            "name": name,
+            "memory_info": mock.Mock(rss=rss, vms=rss),
+            "uids": mock.Mock(real=uid, effective=0, saved=0),
+        }
+        self.error = psutil.AccessDenied(pid)
+
+    def _reread(self):
+        # Only called for attributes process_iter stored as DENIED
+        raise self.error
+
+    name = memory_info = uids = _reread
+
+
+class TestProcsCount(unittest.TestCase):
+    def test_no_filter_uses_pids(self):
+        check = make_check()
+        state = {}
+        with mock.patch.object(
+            check_cp_procs.psutil, "pids", return_value=[1, 2, 3]
+        ), mock.patch.object(
+            check_cp_procs.psutil, "process_iter", side_effect=AssertionError
+        ):
+            check.process_procs(state)
+        self.assertEqual(state["msg"], "3 processes")
+        self.assertEqual(check.status, libnagios.types.Status.OK)
+
+    def test_rss_filter(self):
+        check = make_check(rss=100)
+        state = {}
+        procs = [FakeProc(1, "one", 50), FakeProc(2, "two", 150)]
+        with mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ) as process_iter:
+            check.process_procs(state)
+        self.assertEqual(state["msg"], "1 processes")
+        self.assertEqual(
+            process_iter.call_args.kwargs["attrs"], ["memory_info"]
+        )
+
+    def test_command_and_rss_filter(self):
+        check = make_check(command="two", rss=100)
+        state = {}
+        procs = [
+            FakeProc(1, "one", 150),
+            FakeProc(2, "two", 150),
+            FakeProc(3, "two", 50),
+        ]
+        with mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ):
+            check.process_procs(state)
+        self.assertEqual(state["msg"], "1 processes")
+
+    def test_command_denied(self):
+        check = make_check(command="two", rss=100)
+        procs = [FakeProc(1, check_cp_procs.DENIED, 150)]
+        with mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ), self.assertRaises(libnagios.exceptions.UnknownError):
+            check.process_procs({})
+
+    def test_zombie_skipped(self):
+        check = make_check(rss=100)
+        state = {}
+        procs = [FakeProc(1, "one", 150), FakeProc(2, "zombie")]
+        procs[1].info["memory_info"] = check_cp_procs.DENIED
+        procs[1].error = psutil.ZombieProcess(2)
+        with mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ):
+            check.process_procs(state)
+        self.assertEqual(state["msg"], "1 processes")
+
+    def test_zombie_skipped_vsz(self):
+        check = make_check(metric="VSZ")
+        state = {}
+        procs = [FakeProc(1, "one", 50), FakeProc(2, "zombie")]
+        procs[1].info["memory_info"] = check_cp_procs.DENIED
+        procs[1].error = psutil.ZombieProcess(2)
+        with mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ):
+            check.process_vsz_rss("vsz", state)
+        self.assertEqual(state["msg"], "1 processes")
+
+    def test_memory_denied(self):
+        check = make_check(rss=100)
+        procs = [FakeProc(1, "one", 150)]
+        procs[0].info["memory_info"] = check_cp_procs.DENIED
+        with mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ), self.assertRaises(libnagios.exceptions.UnknownError):
+            check.process_procs({})
+
+    def test_denied_reread(self):
+        check = make_check(rss=100)
+        state = {}
+        procs = [FakeProc(1, "one", 150)]
+        procs[0].info["memory_info"] = check_cp_procs.DENIED
+        procs[0].memory_info = lambda: mock.Mock(rss=150, vms=150)
+        with mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ):
+            check.process_procs(state)
+        self.assertEqual(state["msg"], "1 processes")
+
+    def test_range(self):
+        check = make_check()
+        state = {}
+        with mock.patch.object(
+            check_cp_procs.psutil, "pids", return_value=list(range(15))
+        ):
+            check.process_procs(state)
+        self.assertEqual(check.status, libnagios.types.Status.WARN)
+
+
+@unittest.skipIf(check_cp_procs.IS_WINDOWS, "uid filtering is POSIX only")
+class TestProcsUser(unittest.TestCase):
+    PROCS = [
+        FakeProc(1, "init", uid=0),
+        FakeProc(2, "one", uid=1000),
+        FakeProc(3, "two", uid=1000),
+        FakeProc(4, "three", uid=1001),
+    ]
+
+    def count(self, user, pwent):
+        check = make_check(user=user)
+        state = {}
+        with mock.patch.object(
+            check_cp_procs.pwd, "getpwnam", return_value=pwent
+        ) as getpwnam, mock.patch.object(
+            check_cp_procs.pwd, "getpwuid", return_value=pwent
+        ) as getpwuid, mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=self.PROCS
+        ) as process_iter:
+            check.process_procs(state)
+        self.assertEqual(process_iter.call_args.kwargs["attrs"], ["uids"])
+        return state["msg"], getpwnam, getpwuid
+
+    def test_user_name(self):
+        pwent = mock.Mock(pw_name="alice", pw_uid=1000)
+        msg, getpwnam, getpwuid = self.count("alice", pwent)
+        self.assertEqual(msg, "2 processes")
+        getpwnam.assert_called_once_with("alice")
+        getpwuid.assert_not_called()
+
+    def test_user_uid(self):
+        pwent = mock.Mock(pw_name="bob", pw_uid=1001)
+        msg, getpwnam, getpwuid = self.count("1001", pwent)
+        self.assertEqual(msg, "1 processes")
+        getpwuid.assert_called_once_with(1001)
+        getpwnam.assert_not_called()
+
+    def test_user_root(self):
+        pwent = mock.Mock(pw_name="root", pw_uid=0)
+        msg, _, getpwuid = self.count("0", pwent)
+        self.assertEqual(msg, "1 processes")
+        getpwuid.assert_called_once_with(0)
+
+    def test_user_denied(self):
+        check = make_check(user="alice")
+        procs = [FakeProc(1, "one")]
+        procs[0].info["uids"] = check_cp_procs.DENIED
+        with mock.patch.object(
+            check_cp_procs.pwd,
+            "getpwnam",
+            return_value=mock.Mock(pw_name="alice", pw_uid=1000),
+        ), mock.patch.object(
+            check_cp_procs.psutil, "process_iter", return_value=procs
+        ), self.assertRaises(
+            libnagios.exceptions.UnknownError
+        ):
+            check.process_procs({})
+
+    def test_invalid_user(self):
+        check = make_check(user="nobody-here")
+        with mock.patch.object(
+            check_cp_procs.pwd, "getpwnam", side_effect=KeyError
+        ), self.assertRaises(libnagios.exceptions.UnknownError):
+            check.process_procs({})
+
+
+class TestCountByComm(unittest.TestCase):
+    COMMS = {
+        1: b"sshd\n",
+        2: b"ssh\n",
+        3: b"sshd\n",
+        4: b"very-long-comma\n",
+        5: b"very-long-comma\n",
+    }
+    NAMES = {4: "very-long-command", 5: "very-long-commander"}
+
+    def count(self, command, comms=None, name=None):
+        comms = comms or self.COMMS
+
+        def fake_open(path, mode):
+            value = comms[int(path.split("/")[2])]
+            if isinstance(value, Exception):
+                raise value
+            return io.BytesIO(value)
+
+        def fake_process(pid):
+            proc = mock.Mock()
+            proc.name.side_effect = name or (lambda: self.NAMES[pid])
+            return proc
+
+        with mock.patch.object(
+            check_cp_procs.psutil, "pids", return_value=list(comms)
+        ), mock.patch.object(
+            check_cp_procs, "open", create=True, side_effect=fake_open
+        ), mock.patch.object(
+            check_cp_procs.psutil, "Process", side_effect=fake_process
+        ) as process:
+            return check_cp_procs._count_by_comm(command), process
+
+    def test_exact_match(self):
+        count, process = self.count("sshd")
+        self.assertEqual(count, 2)
+        process.assert_not_called()
+
+    def test_short_name(self):
+        count, process = self.count("ssh")
+        self.assertEqual(count, 1)
+        process.assert_not_called()
+
+    def test_truncated_name(self):
+        count, process = self.count("very-long-command")
+        self.assertEqual(count, 1)
+        self.assertEqual(process.call_count, 2)
+
+    def test_vanished(self):
+        comms = {**self.COMMS, 6: FileNotFoundError()}
+        self.assertEqual(self.count("sshd", comms)[0], 2)
+
+    def test_denied(self):
+        comms = {**self.COMMS, 6: PermissionError()}
+        with self.assertRaises(libnagios.exceptions.UnknownError):
+            self.count("sshd", comms)
+
+    def test_truncated_denied(self):
+        name = mock.Mock(side_effect=psutil.AccessDenied(4))
+        with self.assertRaises(libnagios.exceptions.UnknownError):
+            self.count("very-long-command", name=name)
+
+
+if __name__ == "__main__":
+    unittest.main()
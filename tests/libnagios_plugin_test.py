@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""UNIT TEST for libnagios.plugin"""
+import io
+import json
+import logging
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, "..")
+import libnagios
+
+TRUE = ("1", "true", "yes", "on")
+
+
+class TestPluginPerf(unittest.TestCase):
+    def setUp(self):
+        self.plugin = libnagios.plugin.Plugin()
+
+    def test_add_perf(self):
+        self.plugin.add_perf("one", 1)
+        self.plugin.add_perf("two", 2.0)
+        self.plugin.add_perf("three", "3")
+        self.assertEqual(
+            self.plugin._perfdata, {"one": 1, "two": 2.0, "three": "3"}
+        )
+
+    def test_add_perf_bad_key(self):
+        with self.assertRaises(ValueError):
+            self.plugin.add_perf(1, 1)
+
+    def test_add_perf_bad_value(self):
+        with self.assertRaises(ValueError):
+            self.plugin.add_perf("one", None)
+        with self.assertRaises(ValueError):
+            self.plugin.add_perf("one", [1])
+        self.assertEqual(self.plugin._perfdata, {})
+
+    def test_add_perf_multi(self):
+        self.plugin.add_perf_multi({"one": 1, "two": 2.0, "three": "3"})
+        self.assertEqual(
+            self.plugin._perfdata, {"one": 1, "two": 2.0, "three": "3"}
+        )
+
+    def test_add_perf_multi_not_dict(self):
+        with self.assertRaises(ValueError):
+            self.plugin.add_perf_multi([("one", 1)])
+
+    def test_add_perf_multi_bad_key(self):
+        with self.assertRaises(ValueError):
+            self.plugin.add_perf_multi({"one": 1, 2: 2})
+        self.assertEqual(self.plugin._perfdata, {})
+
+    def test_add_perf_multi_bad_value(self):
+        with self.assertRaises(ValueError):
+            self.plugin.add_perf_multi({"one": 1, "two": None})
+        self.assertEqual(self.plugin._perfdata, {})
+
+
+class TestPluginOutput(unittest.TestCase):
+    def setUp(self):
+        self.plugin = libnagios.plugin.Plugin()
+        self.plugin.message = "All good"
+
+    def test_message_pipe(self):
+        with self.assertRaises(ValueError):
+            self.plugin.message = "Bad | message"
+        with self.assertRaises(ValueError):
+            self.plugin.message = "Summary\nDetails | more"
+        self.plugin.message = ""
+        self.assertEqual(self.plugin.message, "")
+
+    def test_render_message_only(self):
+        self.assertEqual(self.plugin._render(False), b"All good")
+
+    def test_render_perfdata(self):
+        self.plugin.add_perf_multi({"one": 1, "two": 2.5})
+        self.assertEqual(
+            self.plugin._render(False), b"All good|one=1\ntwo=2.5"
+        )
+
+    def test_render_json(self):
+        self.plugin.add_perf_multi({"one": 1, "two": "2"})
+        message, perfdata = self.plugin._render(True).split(b"|")
+        self.assertEqual(message, b"All good")
+        self.assertEqual(json.loads(perfdata), {"one": 1, "two": "2"})
+
+    def test_finish(self):
+        self.plugin.status = libnagios.types.Status.WARN
+        self.plugin.add_perf("one", 1)
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        with mock.patch.object(sys, "stdout", stdout):
+            with self.assertRaises(SystemExit) as ctx:
+                self.plugin.finish(limit=10)
+        self.assertEqual(stdout.buffer.getvalue(), b"All good|o")
+        self.assertEqual(ctx.exception.code, 1)
+
+    def test_finish_no_message(self):
+        plugin = libnagios.plugin.Plugin()
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        with mock.patch.object(sys, "stdout", stdout):
+            with self.assertRaises(SystemExit) as ctx:
+                plugin.finish()
+        self.assertEqual(plugin.status, libnagios.types.Status.CRITICAL)
+        self.assertEqual(ctx.exception.code, 2)
+
+    def test_finish_utf8(self):
+        self.plugin.message = "Temp 20\u00b0C"
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        for limit, expected in ((9, b"Temp 20\xc2\xb0"), (8, b"Temp 20")):
+            stdout.buffer.seek(0)
+            stdout.buffer.truncate()
+            with mock.patch.object(sys, "stdout", stdout):
+                with self.assertRaises(SystemExit):
+                    self.plugin.finish(limit=limit)
+            self.assertEqual(stdout.buffer.getvalue(), expected)
+            stdout.buffer.getvalue().decode("utf-8")
+
+    def test_finish_surrogates(self):
+        self.plugin.message = "proc ab\udcffcd"
+        self.plugin.add_perf("name", "ab\udcffcd")
+        for as_json, perfdata in (
+            (False, b"name=ab\xffcd"),
+            (True, b'{"name": "ab\\udcffcd"}'),
+        ):
+            stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+            with mock.patch.object(sys, "stdout", stdout):
+                with self.assertRaises(SystemExit) as ctx:
+                    self.plugin.finish(as_json=as_json)
+            self.assertEqual(
+                stdout.buffer.getvalue(), b"proc ab\xffcd|" + perfdata
+            )
+            self.assertEqual(ctx.exception.code, 0)
+
+
+class ArgsPlugin(libnagios.plugin.Plugin):
+    def cli(self):
+        self.parser.add_argument("-n", "--number", type=int, default="5")
+        self.parser.add_argument("-t", "--triple", type=float, nargs=3)
+        self.parser.add_argument(
+            "-a", "--add", action="append", default=[["x", "1"]], nargs=2
+        )
+        self.parser.add_argument("-m", choices=("A", "B"), default="A")
+        group = self.parser.add_mutually_exclusive_group()
+        group.add_argument("-y", dest="yes", action="store_true")
+        group.add_argument("-z", dest="no", action="store_true")
+        self.parser.set_defaults(mode="fast", number="6")
+
+
+class TestPluginArgs(unittest.TestCase):
+    def parse(self, *args):
+        plugin = ArgsPlugin()
+        with mock.patch.object(sys, "argv", ["test", *args]):
+            plugin._parse_args()
+        fast = plugin._parse_args_fast(list(args))
+        return fast, plugin.parser.parse_args(list(args))
+
+    def test_fast_matches_argparse(self):
+        for args in (
+            [],
+            ["--debug", "-n", "7"],
+            ["--number=7", "-t", "1", "2", "3"],
+            ["-a", "y", "2", "-a", "z", "3", "-m", "B", "-y"],
+            ["--log", "/dev/null", "--json", "--session-id", "abc"],
+        ):
+            fast, slow = self.parse(*args)
+            self.assertEqual(fast, slow, args)
+
+    def test_fast_falls_back(self):
+        for args in (
+            ["--num", "7"],
+            ["-n7"],
+            ["-n", "x"],
+            ["-m", "C"],
+            ["-t", "1", "2"],
+            ["-y", "-z"],
+            ["extra"],
+        ):
+            plugin = ArgsPlugin()
+            with mock.patch.object(sys, "argv", ["test"]):
+                plugin._parse_args()
+            self.assertIsNone(plugin._parse_args_fast(args), args)
+
+
+def setup():
+    handlers = []
+    # Set up stderr logging
+    stderr = logging.StreamHandler(stream=sys.stderr)
+    handlers.append(stderr)
+
+    # Set the defaults
+    fmt = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+    level = logging.ERROR
+
+    debug = os.getenv("DEBUG", "false").lower()
+    verbose = os.getenv("VERBOSE", "false").lower()
+    if debug in TRUE:
+        level = logging.DEBUG
+    elif verbose in TRUE:
+        level = logging.INFO
+    else:
+        fmt = "%(name)s: %(message)s"
+    logging.basicConfig(level=level, format=fmt, handlers=handlers)
+    log = logging.getLogger()
+    log.setLevel(level)
+
+
+if __name__ == "__main__":
+    setup()
+    unittest.main()